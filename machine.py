@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+machine.py
+Machine constants, paint stations and the G-code emitter shared by
+pointillism_gcode_generator.py, calibration_swatch.py and paint_mixing_grid.py.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+# -------------------------------
+# CONSTANTS (EDIT TO MATCH MACHINE)
+# -------------------------------
+
+# Station grid layout (defaults; scripts may pass their own)
+STATION_X0 = 0.0     # X of first station
+STATION_Y0 = 400.0   # Y of first station
+STATION_DX = 100.0   # ΔX between stations
+STATION_DY = 0.0     # ΔY between stations
+
+# Dip & blot offsets relative to each station
+DIP_OFFSET_X  = 0.0
+DIP_OFFSET_Y  = 0.0
+DIP_OFFSET_Z  = -3.0
+
+BLOT_OFFSET_X = 0.0
+BLOT_OFFSET_Y = 60.0
+BLOT_OFFSET_Z = -2.0
+
+# Z levels
+Z_PICK = -5.0
+Z_SAFE = 15.0
+Z_TRAVEL = 10.0
+Z_PREPAINT = 2.0
+Z_PAINT = -1.0
+
+# Motion
+FEED_TRAVEL = 2500
+FEED_Z = 600
+
+# Time scaling (RichAuto B58 uses ms for G4 P)
+TIME_SCALE = 1000.0   # multiply dwell seconds by this factor
+
+# -------------------------------
+# Stations
+# -------------------------------
+
+@dataclass
+class Station:
+    name: str
+    x: float; y: float
+    z_pick: float; z_safe: float
+    dip_x: float; dip_y: float; dip_z: float
+    blot_x: float; blot_y: float; blot_z: float
+    dip_dwell_s: float; blot_dwell_s: float
+
+def make_stations(colors: List[str],
+                  x0: float = STATION_X0, y0: float = STATION_Y0,
+                  dx: float = STATION_DX, dy: float = STATION_DY,
+                  blot_offset: Tuple[float,float] = (BLOT_OFFSET_X, BLOT_OFFSET_Y)) -> Dict[str, Station]:
+    """Auto-generate one station per color, laid out from (x0,y0) in steps of (dx,dy)."""
+    stations = {}
+    for i, color in enumerate(colors):
+        x = x0 + i * dx
+        y = y0 + i * dy
+        stations[color] = Station(
+            name=color,
+            x=x, y=y,
+            z_pick=Z_PICK, z_safe=Z_SAFE,
+            dip_x=x + DIP_OFFSET_X, dip_y=y + DIP_OFFSET_Y, dip_z=DIP_OFFSET_Z,
+            blot_x=x + blot_offset[0], blot_y=y + blot_offset[1], blot_z=BLOT_OFFSET_Z,
+            dip_dwell_s=1.0, blot_dwell_s=0.5
+        )
+    return stations
+
+# -------------------------------
+# G-code emitter
+# -------------------------------
+
+def ftrim(v, decimals=2):
+    """Format v with at most `decimals` places, dropping trailing zeros (1.50 -> 1.5, 2.00 -> 2)."""
+    s = "%.*f" % (decimals, v)
+    if "." in s: s = s.rstrip("0").rstrip(".")
+    return "0" if s == "-0" else s
+
+class GcodeEmitter:
+    """Write G-code lines to f (any object with .write) using precompiled templates.
+
+    paint_dot(..., hop=True) leaves the brush at Z_PREPAINT so the next close
+    dot can plunge directly; lift() retracts to Z_TRAVEL before a long travel
+    and park() additionally restores G90. With relative=True, the first hopped
+    dot after a park is placed absolutely and the rest of the run is written as
+    G91 deltas between consecutive rounded absolute targets, so every dab lands
+    where G90 output would put it and rounding never accumulates.
+    """
+
+    def __init__(self, f, decimals=2, feed_travel=FEED_TRAVEL, feed_z=FEED_Z, relative=False, rapid_feed=True):
+        self.w = f.write
+        self.decimals = decimals
+        self.feed_z = feed_z
+        self.relative = relative
+        ft = self.ft
+        # rapid_feed=False leaves F off G0 lines (controller uses its rapid rate)
+        rapid_end = " F%d\n" % feed_travel if rapid_feed else "\n"
+        self._move_xy = "G0 X%s Y%s" + rapid_end
+        self._move_z = "G1 Z%%s F%d\n" % feed_z
+        self._dwell = "G4 P%.0f\n"
+        mz = self._move_z
+        self._dot_down = mz % ft(Z_PREPAINT) + mz % ft(Z_PAINT)
+        self._dot_hop_down = mz % ft(Z_PAINT)
+        self._dot_hop_up = mz % ft(Z_PREPAINT)
+        self._dot_up = mz % ft(Z_TRAVEL)
+        # The same Z sequences as deltas, for relative (G91) runs
+        self._rel_dot_down = mz % ft(Z_PREPAINT-Z_TRAVEL) + mz % ft(Z_PAINT-Z_PREPAINT)
+        self._rel_dot_hop_down = mz % ft(Z_PAINT-Z_PREPAINT)
+        self._rel_dot_hop_up = mz % ft(Z_PREPAINT-Z_PAINT)
+        self._rel_dot_up = mz % ft(Z_TRAVEL-Z_PREPAINT)
+        self._rel_end = rapid_end
+        self.hopping = False
+        self.rel = False
+        self.cur_x = self.cur_y = 0.0
+
+    def ft(self, v): return ftrim(v, self.decimals)
+
+    def g(self, line): self.w(line + "\n")
+
+    def move_xy(self, x, y): self.w(self._move_xy % (self.ft(x), self.ft(y)))
+
+    def move_z(self, z, feed=None):
+        if feed is None or feed == self.feed_z: self.w(self._move_z % self.ft(z))
+        else: self.g("G1 Z%s F%d" % (self.ft(z), feed))
+
+    def dwell(self, s): self.w(self._dwell % (s*TIME_SCALE))
+
+    def pickup_brush(self, st: Station):
+        self.g(f"(Pickup {st.name})")
+        self.move_xy(st.x,st.y); self.move_z(st.z_safe); self.move_z(st.z_pick); self.dwell(0.3); self.move_z(st.z_safe)
+
+    def return_brush(self, st: Station):
+        self.g(f"(Return {st.name})")
+        self.move_xy(st.x,st.y); self.move_z(st.z_safe); self.move_z(st.z_pick); self.dwell(0.3); self.move_z(st.z_safe)
+
+    def dip_brush(self, st: Station):
+        self.g(f"(Dip {st.name})")
+        self.move_xy(st.dip_x,st.dip_y); self.move_z(st.z_safe); self.move_z(st.dip_z); self.dwell(st.dip_dwell_s); self.move_z(st.z_safe)
+        self.blot_brush(st, st.blot_dwell_s)
+
+    def blot_brush(self, st: Station, dwell_s):
+        self.move_xy(st.blot_x,st.blot_y); self.move_z(st.z_safe); self.move_z(st.blot_z); self.dwell(dwell_s); self.move_z(st.z_safe)
+
+    def lift(self):
+        """Retract from a hop to Z_TRAVEL."""
+        if self.hopping:
+            self.w(self._rel_dot_up if self.rel else self._dot_up); self.hopping = False
+
+    def park(self):
+        """lift() and return to absolute mode, ready for station moves."""
+        self.lift()
+        if self.rel: self.g("G90"); self.rel = False
+
+    def paint_dot(self, x, y, dwell_s, z=Z_PAINT, hop=False):
+        """Dab at (x,y) down to z; retract to Z_TRAVEL, or stay at Z_PREPAINT if hop."""
+        w = self.w
+        if not hop:
+            self.move_xy(x,y)
+            if z == Z_PAINT: w(self._dot_down)
+            else: self.move_z(Z_PREPAINT); self.move_z(z)
+            self.dwell(dwell_s)
+            w(self._dot_up)
+            return
+        if self.rel:
+            # delta between rounded absolute targets, so dabs match G90 output exactly
+            ax = float(self.ft(x)); ay = float(self.ft(y))
+            sx = self.ft(ax-self.cur_x); sy = self.ft(ay-self.cur_y)
+            self.cur_x = ax; self.cur_y = ay
+            w("G0" + (" X"+sx if sx!="0" else "") + (" Y"+sy if sy!="0" else "") + self._rel_end)
+            if z == Z_PAINT:
+                w(self._rel_dot_hop_down if self.hopping else self._rel_dot_down)
+                self.dwell(dwell_s)
+                w(self._rel_dot_hop_up)
+            else:
+                zr = float(self.ft(z))
+                if not self.hopping: self.move_z(Z_PREPAINT-Z_TRAVEL)
+                self.move_z(zr-Z_PREPAINT); self.dwell(dwell_s); self.move_z(Z_PREPAINT-zr)
+        else:
+            sx = self.ft(x); sy = self.ft(y)
+            self.cur_x = float(sx); self.cur_y = float(sy)
+            w(self._move_xy % (sx,sy))
+            if z == Z_PAINT:
+                w(self._dot_hop_down if self.hopping else self._dot_down)
+                self.dwell(dwell_s)
+                w(self._dot_hop_up)
+            else:
+                if not self.hopping: self.move_z(Z_PREPAINT)
+                self.move_z(z); self.dwell(dwell_s); self.move_z(Z_PREPAINT)
+            if self.relative: self.g("G91"); self.rel = True
+        self.hopping = True
+
+class CompactWriter:
+    """File wrapper that drops G-code words the controller already holds modally.
+
+    Rewrites G0/G1 lines written through it: the motion G word is omitted when
+    unchanged, F only when the feed changes, and (in G90) X/Y/Z only when that
+    axis changes; a move left with no axis words is dropped. Consecutive G90
+    moves along the same single X or Y axis (same G, same feed) are coalesced
+    into the last one: G0 rapids always, G1 feed moves only while they keep
+    going the same direction, so the painted toolpath never changes.
+    Coordinates after G91 are always kept, and absolute positions are
+    forgotten across a mode switch. All other lines pass through
+    untouched. Call flush() after the last write.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.last_g = None
+        self.feed = None
+        self.pos = {}
+        self.relative = False
+        self._tail = ""
+        self._pending = None   # words of a held single-axis X/Y move
+        self._pending_axis = None
+        self._pending_from = None   # that axis' position before the held move
+
+    def write(self, text):
+        lines = (self._tail + text).split("\n")
+        self._tail = lines.pop()
+        out = []
+        for l in lines: self._compact(l, out)
+        if out: self.f.write("\n".join(out) + "\n")
+
+    def flush(self):
+        out = []
+        if self._tail: self._compact(self._tail, out); self._tail = ""
+        self._release(out)
+        if out: self.f.write("\n".join(out) + "\n")
+
+    def _release(self, out):
+        if self._pending: out.append(" ".join(self._pending)); self._pending = None
+
+    def _compact(self, line, out):
+        words = line.split()
+        if not words or line.startswith("(") or words[0] not in ("G0", "G1") \
+                or any(w[0] not in "XYZF" for w in words[1:]):
+            if "G90" in words or "G91" in words:
+                self.relative = "G91" in words
+                self.pos = {}
+            self._release(out); out.append(line)
+            return
+        feed = self.feed
+        pos = {}
+        kept = []
+        for w in words[1:]:
+            a, v = w[0], w[1:]
+            if a == "F":
+                if v != feed: kept.append(w); feed = v
+            elif self.relative or self.pos.get(a) != v:
+                kept.append(w); pos[a] = v
+        if not pos: return
+        self.feed = feed
+        single = not self.relative and len(pos) == 1 and next(iter(pos)) in "XY"
+        if single:
+            axis = next(iter(pos)); start = self.pos.get(axis)
+        if not self.relative: self.pos.update(pos)
+        if words[0] != self.last_g:
+            kept.insert(0, words[0]); self.last_g = words[0]
+        if single and self._pending and len(kept) == 1 and self._pending_axis == axis \
+                and self._mergeable(words[0], float(pos[axis])):
+            # same axis, G and feed, and no part of a feed stroke is skipped
+            i = next(i for i, w in enumerate(self._pending) if w[0] == axis)
+            self._pending[i] = kept[0]
+            return
+        self._release(out)
+        if single:
+            self._pending = kept; self._pending_axis = axis
+            self._pending_from = None if start is None else float(start)
+        else: out.append(" ".join(kept))
+
+    def _mergeable(self, g, new):
+        """G0 rapids always coalesce; G1 only while the stroke keeps its direction."""
+        if g == "G0": return True
+        i = next(i for i, w in enumerate(self._pending) if w[0] == self._pending_axis)
+        held = float(self._pending[i][1:])
+        return self._pending_from is not None and (held-self._pending_from)*(new-held) > 0
@@ -4,50 +4,30 @@ pointillism_gcode_generator.py
 Pointillism-style painting with RGB6 or CMYK palette.
 """
 
-import argparse, os, math
-from dataclasses import dataclass
-from typing import Dict, Tuple, List
+import argparse, io, os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from numba import njit
 from PIL import Image
 
+from machine import CompactWriter, GcodeEmitter, make_stations, Z_TRAVEL
+
 # -------------------------------
-# CONSTANTS (EDIT TO MATCH MACHINE)
+# CONSTANTS (EDIT TO MATCH MACHINE; shared machine constants live in machine.py)
 # -------------------------------
 
-# Station grid layout
-STATION_X0 = 0.0     # X of first station
-STATION_Y0 = 400.0   # Y of first station
-STATION_DX = 100.0   # ΔX between stations
-STATION_DY = 0.0     # ΔY between stations
-
-# Dip & blot offsets relative to each station
-DIP_OFFSET_X  = 0.0
-DIP_OFFSET_Y  = 0.0
-DIP_OFFSET_Z  = -3.0
-
-BLOT_OFFSET_X = 0.0
-BLOT_OFFSET_Y = 60.0
-BLOT_OFFSET_Z = -2.0
-
-# Z levels
-Z_PICK = -5.0
-Z_SAFE = 15.0
-Z_TRAVEL = 10.0
-Z_PREPAINT = 2.0
-Z_PAINT = -1.0
-
-# Motion / paint
-FEED_TRAVEL = 2500
-FEED_Z = 600
+# Paint
 DAB_DWELL_S = 0.05
 RE_DIP_EVERY_N_DOTS = 120
 RE_DIP_AFTER_TRAVEL_MM = 180.0
+HOP_MAX_PITCHES = 1.5   # dots this close (in dot pitches) hop at Z_PREPAINT instead of retracting to Z_TRAVEL
 CLEAN_AT_END = True
 
-# Time scaling (RichAuto B58 uses ms for G4 P)
-TIME_SCALE = 1000.0   # multiply dwell seconds by this factor
-
 WHITE_THRESHOLD = 240
 
+# Dot visit order: bucket size (in grid cells) for the nearest-neighbor tour
+TOUR_BUCKET = 8
+
 COLOR_ORDER_RGB6 = ["black", "blue", "red", "green", "yellow", "white"]
 COLOR_ORDER_CMYK = ["yellow", "magenta", "cyan", "black"]
 
@@ -65,147 +45,209 @@ PALETTE_RGB = {
     "white":  (255, 255, 255),
 }
 
-@dataclass
-class Station:
-    name: str
-    x: float; y: float
-    z_pick: float; z_safe: float
-    dip_x: float; dip_y: float; dip_z: float
-    blot_x: float; blot_y: float; blot_z: float
-    dip_dwell_s: float; blot_dwell_s: float
-
-def make_stations(palette: str) -> Dict[str, Station]:
-    """Auto-generate stations for the selected palette."""
-    colors = PALETTES[palette]
-    stations = {}
-    for i, color in enumerate(colors):
-        x = STATION_X0 + i * STATION_DX
-        y = STATION_Y0 + i * STATION_DY
-        stations[color] = Station(
-            name=color,
-            x=x, y=y,
-            z_pick=Z_PICK, z_safe=Z_SAFE,
-            dip_x=x + DIP_OFFSET_X, dip_y=y + DIP_OFFSET_Y, dip_z=DIP_OFFSET_Z,
-            blot_x=x + BLOT_OFFSET_X, blot_y=y + BLOT_OFFSET_Y, blot_z=BLOT_OFFSET_Z,
-            dip_dwell_s=1.0, blot_dwell_s=0.5
-        )
-    return stations
-
 # -------------------------------
 # Color conversion & dithering
 # -------------------------------
 
-def nearest_palette_color(rgb: Tuple[int,int,int]) -> str:
-    r,g,b = rgb
-    best, best_d2 = None, 1e18
-    for name,(R,G,B) in PALETTE_RGB.items():
-        d2 = (r-R)**2 + (g-G)**2 + (b-B)**2
-        if d2 < best_d2:
-            best, best_d2 = name, d2
-    return best
-
-def rgb_to_cmyk(r,g,b):
-    R,G,B = [x/255.0 for x in (r,g,b)]
-    K = 1 - max(R,G,B)
-    if K >= 1.0:
-        return (0,0,0,1)
-    C = (1-R-K)/(1-K)
-    M = (1-G-K)/(1-K)
-    Y = (1-B-K)/(1-K)
-    return (C,M,Y,K)
-
-def floyd_steinberg_dither_channel(img_chan, w,h):
-    arr = [[img_chan[y][x] for x in range(w)] for y in range(h)]
-    out = [[0]*w for _ in range(h)]
+PALETTE_NAMES = list(PALETTE_RGB.keys())
+PALETTE_ARR = np.array(list(PALETTE_RGB.values()), dtype=np.int16)   # (6,3)
+
+def _palette_image():
+    pal=Image.new("P",(1,1))
+    pal.putpalette([c for rgb in PALETTE_RGB.values() for c in rgb])
+    return pal
+
+PALETTE_IMAGE = _palette_image()
+
+def nearest_palette_index(im, dither=True):
+    """Index into PALETTE_NAMES for every pixel of an RGB image.
+
+    With dither, PIL's C quantizer maps and Floyd-Steinberg dithers in one call
+    (its palette lookup is approximate). Without, each pixel gets the exact
+    nearest palette color by squared RGB distance.
+    """
+    if dither:
+        return np.asarray(im.quantize(palette=PALETTE_IMAGE, dither=Image.FLOYDSTEINBERG))
+    img = np.asarray(im, dtype=np.int16)
+    d2 = ((img[:,:,None,:]-PALETTE_ARR[None,None,:,:]).astype(np.int32)**2).sum(-1)
+    return d2.argmin(-1)
+
+def rgb_to_cmyk(pixels):
+    """Convert an HxWx3 RGB array to an HxWx4 float32 C,M,Y,K array (0..1)."""
+    arr = np.asarray(pixels, dtype=np.float32)/255.0
+    K = 1 - arr.max(-1)
+    black = K >= 1.0
+    denom = np.where(black, 1.0, 1-K).astype(np.float32)
+    cmy = np.where(black[...,None], 0.0, (1-arr-K[...,None])/denom[...,None])
+    return np.concatenate((cmy, K[...,None]), axis=-1).astype(np.float32)
+
+@njit(cache=True, fastmath=True)
+def floyd_steinberg_dither(a):
+    """Dither every channel of a float32 HxWxN array (0..1) to a uint8 HxWxN mask of 0/1 in one pass."""
+    h, w, n = a.shape
+    arr = a.copy()
+    out = np.zeros((h, w, n), dtype=np.uint8)
     for y in range(h):
         for x in range(w):
-            old = arr[y][x]
-            new = 1 if old >= 0.5 else 0
-            out[y][x] = new
-            err = old - new
-            if x+1<w: arr[y][x+1]+=err*7/16
-            if y+1<h and x>0: arr[y+1][x-1]+=err*3/16
-            if y+1<h: arr[y+1][x]+=err*5/16
-            if y+1<h and x+1<w: arr[y+1][x+1]+=err*1/16
+            for c in range(n):
+                old = arr[y,x,c]
+                new = 1 if old >= 0.5 else 0
+                out[y,x,c] = new
+                err = old - new
+                if x+1<w: arr[y,x+1,c]+=err*7/16
+                if y+1<h and x>0: arr[y+1,x-1,c]+=err*3/16
+                if y+1<h: arr[y+1,x,c]+=err*5/16
+                if y+1<h and x+1<w: arr[y+1,x+1,c]+=err*1/16
     return out
 
-def serpentine_indices(w,h):
-    order=[]
-    for j in range(h):
-        row=[(i,j) for i in range(w)]
-        if j%2==1: row.reverse()
-        order.extend(row)
+def mask_points(mask):
+    """(N,2) int64 array of the (x,y) cells set in a 2-D mask, in row-major order."""
+    return np.ascontiguousarray(np.argwhere(mask)[:, ::-1], dtype=np.int64)
+
+def serpentine_order(xy):
+    """Visit order over (N,2) grid points: row by row, reversing odd rows."""
+    x, y = xy[:,0], xy[:,1]
+    return np.lexsort((np.where(y&1, -x, x), y))
+
+@njit(cache=True)
+def nearest_neighbor_order(xy, bucket):
+    """Greedy nearest-neighbor tour over (N,2) integer grid points, starting at (0,0).
+
+    Points are bucketed into bucket x bucket cells; each step scans rings of
+    cells around the current point until no closer point can remain.
+    Returns the visit order as an index array into xy.
+    """
+    n = xy.shape[0]
+    order = np.empty(n, dtype=np.int64)
+    if n == 0: return order
+    nbx = xy[:,0].max()//bucket + 1
+    nby = xy[:,1].max()//bucket + 1
+    cell = (xy[:,1]//bucket)*nbx + xy[:,0]//bucket
+    by_cell = np.argsort(cell, kind="mergesort")
+    start = np.zeros(nbx*nby + 1, dtype=np.int64)
+    for i in range(n): start[cell[i]+1] += 1
+    for c in range(nbx*nby): start[c+1] += start[c]
+    left = start[1:] - start[:-1]
+    used = np.zeros(n, dtype=np.bool_)
+    cx = 0; cy = 0
+    for k in range(n):
+        bx = min(cx//bucket, nbx-1); by = min(cy//bucket, nby-1)
+        best = -1; best_d2 = 0
+        r = 0
+        while True:
+            for j in range(max(by-r, 0), min(by+r, nby-1)+1):
+                step = 1 if (j == by-r or j == by+r) else 2*r
+                i = bx - r
+                while i <= bx + r:
+                    if i >= 0 and i < nbx and left[j*nbx+i] > 0:
+                        c = j*nbx + i
+                        for q in range(start[c], start[c+1]):
+                            p = by_cell[q]
+                            if used[p]: continue
+                            dx = xy[p,0]-cx; dy = xy[p,1]-cy
+                            d2 = dx*dx + dy*dy
+                            if best < 0 or d2 < best_d2:
+                                best = p; best_d2 = d2
+                    i += step
+            if best >= 0 and best_d2 <= (r*bucket)**2: break
+            if r > nbx + nby: break
+            r += 1
+        order[k] = best; used[best] = True
+        left[cell[best]] -= 1
+        cx = xy[best,0]; cy = xy[best,1]
     return order
 
 # -------------------------------
 # G-code generation
 # -------------------------------
 
-def gen_gcode(color_points, color_order, grid_cols, grid_rows, stations, args):
-    lines=[]; g=lines.append
+def dip_breaks(steps, every_n, after_mm):
+    """Indices of the dots to re-dip before, given each dot's travel from the previous one.
+
+    A dip is due every_n dots after the last one, or once the travel since it
+    reaches after_mm (if > 0); breakpoints are found with cumsum + searchsorted.
+    """
+    cum=np.cumsum(steps)
+    n=len(cum); breaks=[]; s=0
+    while True:
+        nxt=s+every_n
+        if after_mm>0:
+            nxt=min(nxt,int(np.searchsorted(cum,cum[s]+after_mm)))
+        nxt=max(nxt,s+1)
+        if nxt>=n: break
+        breaks.append(nxt); s=nxt
+    return breaks
+
+def _emit_color(out, color, pts, st, args):
+    """Write the G-code block painting one color's (N,2) grid points, from pickup to return, to out."""
+    em=GcodeEmitter(out,decimals=args.decimals,relative=args.relative_moves,rapid_feed=not args.compact)
+    em.g(f"(=== {color} {len(pts)} dots ===)")
+    if args.order=="nearest":
+        order=nearest_neighbor_order(pts,TOUR_BUCKET)
+    else:
+        order=serpentine_order(pts)
+    # mm coordinates and dot-to-dot travel for the whole run at once
+    origin=np.array([args.origin_x+args.margin_mm,args.origin_y+args.margin_mm])
+    mm_pts=origin+pts[order]*args.dot_pitch_mm
+    steps=np.zeros(len(mm_pts))
+    steps[1:]=np.hypot(np.diff(mm_pts[:,0]),np.diff(mm_pts[:,1]))
+
+    # After a dab the brush stays at Z_PREPAINT; it retracts to Z_TRAVEL
+    # only before a long travel, a dip, or returning the brush.
+    hop_max=HOP_MAX_PITCHES*args.dot_pitch_mm
+
+    breaks=iter(dip_breaks(steps,RE_DIP_EVERY_N_DOTS,RE_DIP_AFTER_TRAVEL_MM))
+    next_dip=next(breaks,-1)
+
+    em.pickup_brush(st); em.dip_brush(st)
+    for i,((x_mm,y_mm),step) in enumerate(zip(mm_pts.tolist(),steps.tolist())):
+        if i==next_dip:
+            em.park(); em.dip_brush(st); next_dip=next(breaks,-1)
+        elif step>hop_max:
+            em.lift()
+        em.paint_dot(x_mm,y_mm,DAB_DWELL_S,hop=True)
+    em.park()
+    if CLEAN_AT_END:
+        em.blot_brush(st,0.3)
+    em.return_brush(st)
+
+def _emit_color_block(color, pts, st, args):
+    """_emit_color into a string, for pool workers."""
+    buf=io.StringIO()
+    _emit_color(buf,color,pts,st,args)
+    return buf.getvalue()
+
+def gen_gcode(f, color_points, color_order, grid_cols, grid_rows, stations, args):
+    """Stream the painting program to the open text file f.
+
+    color_points maps each color to an (N,2) int array of (x,y) grid cells.
+    Colors are independent until concatenation, so with args.jobs > 1 their
+    blocks are built in a process pool and written back in color_order;
+    otherwise each block is streamed straight into f.
+    With args.compact the whole stream goes through CompactWriter.
+    """
+    if args.compact: f=CompactWriter(f)
+    em=GcodeEmitter(f,decimals=args.decimals,rapid_feed=not args.compact)
+    g=em.g
     g("(Pointillism painting)")
     g(f"(Grid {grid_cols}x{grid_rows}, pitch {args.dot_pitch_mm} mm)")
     g("G21"); g("G90"); g("G94")
-    g(f"G0 Z{Z_TRAVEL:.3f}")
-
-    origin_x=args.origin_x+args.margin_mm
-    origin_y=args.origin_y+args.margin_mm
-
-    def xy_of_pixel(px,py):
-        return (origin_x+px*args.dot_pitch_mm,
-                origin_y+py*args.dot_pitch_mm)
-    def move_xy(x,y): g(f"G0 X{x:.3f} Y{y:.3f} F{FEED_TRAVEL}")
-    def move_z(z,feed=FEED_Z): g(f"G1 Z{z:.3f} F{feed}")
-    def dwell(s): g(f"G4 P{s*TIME_SCALE:.0f}")
-
-    def pickup_brush(color):
-        st=stations[color]
-        g(f"(Pickup {color})")
-        move_xy(st.x,st.y); move_z(st.z_safe); move_z(st.z_pick); dwell(0.3); move_z(st.z_safe)
-
-    def return_brush(color):
-        st=stations[color]
-        g(f"(Return {color})")
-        move_xy(st.x,st.y); move_z(st.z_safe); move_z(st.z_pick); dwell(0.3); move_z(st.z_safe)
-
-    def dip_brush(color):
-        st=stations[color]
-        g(f"(Dip {color})")
-        move_xy(st.dip_x,st.dip_y); move_z(st.z_safe); move_z(st.dip_z); dwell(st.dip_dwell_s); move_z(st.z_safe)
-        move_xy(st.blot_x,st.blot_y); move_z(st.z_safe); move_z(st.blot_z); dwell(st.blot_dwell_s); move_z(st.z_safe)
-
-    def paint_dot(x,y,dwell_time):
-        move_xy(x,y)
-        move_z(Z_PREPAINT)
-        move_z(Z_PAINT)
-        dwell(dwell_time)
-        move_z(Z_TRAVEL)
-
-    serp=serpentine_indices(grid_cols,grid_rows)
-    for color in color_order:
-        pts=color_points[color]
-        if not pts: continue
-        g(f"(=== {color} {len(pts)} dots ===)")
-        pickup_brush(color); dip_brush(color)
-        dots_since=0; travel_since=0.0
-        last=None
-        for (px,py) in serp:
-            if (px,py) not in pts: continue
-            x_mm,y_mm=xy_of_pixel(px,py)
-            if last is not None:
-                travel_since+=math.hypot(x_mm-last[0], y_mm-last[1])
-            if dots_since>=RE_DIP_EVERY_N_DOTS or (RE_DIP_AFTER_TRAVEL_MM>0 and travel_since>=RE_DIP_AFTER_TRAVEL_MM):
-                dip_brush(color); dots_since=0; travel_since=0.0
-            paint_dot(x_mm,y_mm,DAB_DWELL_S)
-            dots_since+=1; last=(x_mm,y_mm)
-        if CLEAN_AT_END:
-            st=stations[color]; move_xy(st.blot_x,st.blot_y); move_z(st.z_safe); move_z(st.blot_z); dwell(0.3); move_z(st.z_safe)
-        return_brush(color)
-
-    g("G0 Z{:.3f}".format(Z_TRAVEL))
+    g(f"G0 Z{em.ft(Z_TRAVEL)}")
+
+    todo=[(c,color_points[c],stations[c]) for c in color_order if len(color_points[c])]
+    if args.jobs>1 and len(todo)>1:
+        with ProcessPoolExecutor(max_workers=min(args.jobs,len(todo))) as pool:
+            futures=[pool.submit(_emit_color_block,c,pts,st,args) for c,pts,st in todo]
+            for fut in futures:
+                f.write(fut.result())
+    else:
+        for c,pts,st in todo:
+            _emit_color(f,c,pts,st,args)
+
+    g(f"G0 Z{em.ft(Z_TRAVEL)}")
     g("G0 X0 Y0")
     g("M2")
-    return "\n".join(lines)
+    if args.compact: f.flush()
 
 # -------------------------------
 # Main
@@ -222,6 +264,19 @@ def main():
     parser.add_argument("--origin-y",type=float,default=0.0)
     parser.add_argument("--margin-mm",type=float,default=0.0)
     parser.add_argument("--palette",choices=["rgb6","cmyk"],default="rgb6")
+    parser.add_argument("--dither",choices=["fs","none"],default="fs",
+                        help="rgb6 palette mapping: Floyd-Steinberg dithered or exact nearest color")
+    parser.add_argument("--decimals",type=int,default=2,
+                        help="Max decimal places for coordinates (trailing zeros dropped)")
+    parser.add_argument("--relative-moves",action="store_true",
+                        help="Write dot-to-dot moves in relative mode (G91)")
+    parser.add_argument("--compact",action="store_true",
+                        help="Omit modal G words, unchanged F and coordinates, and F on G0 "
+                             "(assumes the controller runs G0 at its own rapid rate)")
+    parser.add_argument("--jobs",type=int,default=1,
+                        help="Worker processes for per-color G-code assembly (default 1 = serial; each worker pays its own import and Numba load)")
+    parser.add_argument("--order",choices=["nearest","serpentine"],default="nearest",
+                        help="Dot visit order within each color")
     args=parser.parse_args()
 
     im=Image.open(args.input).convert("RGB")
@@ -230,47 +285,26 @@ def main():
     grid_cols=max(1,int(round(usable_w/args.dot_pitch_mm)))
     grid_rows=max(1,int(round(usable_h/args.dot_pitch_mm)))
     im_resized=im.resize((grid_cols,grid_rows),Image.LANCZOS)
+    pixels=np.asarray(im_resized,dtype=np.uint8)   # (H,W,3)
 
-    stations=make_stations(args.palette)
+    stations=make_stations(PALETTES[args.palette])
     color_points={}
 
     if args.palette=="rgb6":
-        for c in PALETTE_RGB.keys():
-            color_points[c]=[]
-        for y in range(grid_rows):
-            for x in range(grid_cols):
-                rgb=im_resized.getpixel((x,y))
-                if rgb[0]>=WHITE_THRESHOLD and rgb[1]>=WHITE_THRESHOLD and rgb[2]>=WHITE_THRESHOLD:
-                    continue
-                col=nearest_palette_color(rgb)
-                color_points[col].append((x,y))
-        gcode=gen_gcode(color_points,COLOR_ORDER_RGB6,grid_cols,grid_rows,stations,args)
+        idx=nearest_palette_index(im_resized,dither=args.dither=="fs")
+        white=(pixels>=WHITE_THRESHOLD).all(-1)
+        for k,c in enumerate(PALETTE_NAMES):
+            color_points[c]=mask_points((idx==k)&~white)
+        color_order=COLOR_ORDER_RGB6
 
     else: # cmyk
-        Cchan=[[0]*grid_cols for _ in range(grid_rows)]
-        Mchan=[[0]*grid_cols for _ in range(grid_rows)]
-        Ychan=[[0]*grid_cols for _ in range(grid_rows)]
-        Kchan=[[0]*grid_cols for _ in range(grid_rows)]
-        for y in range(grid_rows):
-            for x in range(grid_cols):
-                r,g,b=im_resized.getpixel((x,y))
-                C,M,Y,K=rgb_to_cmyk(r,g,b)
-                Cchan[y][x]=C; Mchan[y][x]=M; Ychan[y][x]=Y; Kchan[y][x]=K
-        Cd=floyd_steinberg_dither_channel(Cchan,grid_cols,grid_rows)
-        Md=floyd_steinberg_dither_channel(Mchan,grid_cols,grid_rows)
-        Yd=floyd_steinberg_dither_channel(Ychan,grid_cols,grid_rows)
-        Kd=floyd_steinberg_dither_channel(Kchan,grid_cols,grid_rows)
-        color_points={"cyan":[], "magenta":[], "yellow":[], "black":[]}
-        for y in range(grid_rows):
-            for x in range(grid_cols):
-                if Cd[y][x]==1: color_points["cyan"].append((x,y))
-                if Md[y][x]==1: color_points["magenta"].append((x,y))
-                if Yd[y][x]==1: color_points["yellow"].append((x,y))
-                if Kd[y][x]==1: color_points["black"].append((x,y))
-        gcode=gen_gcode(color_points,COLOR_ORDER_CMYK,grid_cols,grid_rows,stations,args)
-
-    with open(args.output,"w",encoding="utf-8") as f:
-        f.write(gcode)
+        dots=floyd_steinberg_dither(rgb_to_cmyk(pixels))
+        for i,c in enumerate(("cyan","magenta","yellow","black")):
+            color_points[c]=mask_points(dots[...,i]==1)
+        color_order=COLOR_ORDER_CMYK
+
+    with open(args.output,"w",encoding="utf-8",buffering=1<<20) as f:
+        gen_gcode(f,color_points,color_order,grid_cols,grid_rows,stations,args)
     print("Wrote",args.output)
 
 if __name__=="__main__":
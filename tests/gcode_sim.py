@@ -0,0 +1,35 @@
+"""Tiny G-code interpreter for tests: follows G90/G91, modal G0/G1 and F."""
+
+import re
+
+WORD = re.compile(r"([A-Z])(-?[\d.]+)")
+
+def simulate(text):
+    """Return (dwells, moves) for a G-code program.
+
+    dwells: (x, y, z, P) at every G4, i.e. where each dab/dip/blot happens.
+    moves:  (G, F, (x, y, z)) for every line that changes position.
+    Positions are rounded to 1e-6 to absorb float summation noise.
+    """
+    rel = False; pos = {"X": 0.0, "Y": 0.0, "Z": 0.0}; g = None; feed = None
+    dwells = []; moves = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("("): continue
+        words = {}
+        for k, v in WORD.findall(line): words.setdefault(k, []).append(v)
+        gs = words.get("G", [])
+        if "90" in gs: rel = False
+        if "91" in gs: rel = True
+        if "4" in gs:
+            dwells.append((pos["X"], pos["Y"], pos["Z"], words["P"][0])); continue
+        for v in gs:
+            if v in ("0", "1"): g = v
+        if "F" in words: feed = words["F"][0]
+        old = dict(pos)
+        for ax in "XYZ":
+            if ax in words:
+                v = float(words[ax][0])
+                pos[ax] = round(pos[ax] + v if rel else v, 6)
+        if pos != old: moves.append((g, feed, (pos["X"], pos["Y"], pos["Z"])))
+    return dwells, moves
@@ -0,0 +1,89 @@
+"""CompactWriter must not change where the machine goes, at what mode and feed."""
+
+import io
+
+import numpy as np
+
+from machine import CompactWriter, GcodeEmitter, make_stations
+from gcode_sim import simulate
+
+def compact(text):
+    buf = io.StringIO()
+    cw = CompactWriter(buf)
+    cw.write(text); cw.flush()
+    return buf.getvalue()
+
+def program(relative, rng):
+    buf = io.StringIO()
+    em = GcodeEmitter(buf, decimals=2, relative=relative, rapid_feed=False)
+    em.g("G21"); em.g("G90"); em.g("G94")
+    stations = make_stations(["black", "blue"])
+    for st in stations.values():
+        em.pickup_brush(st); em.dip_brush(st)
+        cells = rng.integers(0, 40, size=(200, 2))
+        for i, (x, y) in enumerate(cells*2.7):
+            if i and i % 50 == 0: em.park(); em.dip_brush(st)
+            elif rng.random() < 0.3: em.lift()
+            em.paint_dot(x, y, 0.05, hop=True)
+            if not em.rel and rng.random() < 0.2:
+                # a painted stroke: single-axis G1 runs, some reversing direction
+                em.g("G1 Z-1 F300"); em.g("G1 X%d Y%d" % tuple(rng.integers(0, 100, 2)))
+                axis = "XY"[int(rng.integers(2))]
+                for v in rng.integers(0, 100, int(rng.integers(1, 6))):
+                    em.g("G1 %s%d" % (axis, v))
+                em.g("G1 Z2 F600")
+        em.park(); em.blot_brush(st, 0.3); em.return_brush(st)
+    em.g("G0 Z10"); em.g("G0 X0 Y0"); em.g("M2")
+    return buf.getvalue()
+
+def between(r, p, q):
+    """p lies strictly inside the axis-aligned segment r-q."""
+    axes = [i for i in range(3) if r[i] != q[i]]
+    if len(axes) != 1: return False
+    a = axes[0]
+    return all(p[i] == r[i] for i in range(3) if i != a) and min(r[a], q[a]) < p[a] < max(r[a], q[a])
+
+def assert_same_toolpath(mv_a, mv_b):
+    """mv_b must be mv_a minus dropped rapids and minus G1 points inside a straight kept G1 stroke."""
+    j = 0; last = (0.0, 0.0, 0.0)
+    for m in mv_a:
+        if j < len(mv_b) and m == mv_b[j]:
+            last = m[2]; j += 1
+            continue
+        if m[0] == "1":
+            nxt = mv_b[j]
+            assert nxt[:2] == m[:2] and between(last, m[2], nxt[2]), m
+    assert j == len(mv_b)
+
+def check_equivalent(text):
+    small = compact(text)
+    dw_a, mv_a = simulate(text)
+    dw_b, mv_b = simulate(small)
+    assert dw_a == dw_b
+    assert mv_a[-1] == mv_b[-1]
+    assert_same_toolpath(mv_a, mv_b)
+    assert len(small) < len(text)
+
+def test_absolute_program_equivalent():
+    check_equivalent(program(False, np.random.default_rng(5)))
+
+def test_relative_program_equivalent():
+    check_equivalent(program(True, np.random.default_rng(6)))
+
+def test_modal_words_dropped():
+    assert compact("G1 Z2 F600\nG1 Z-1 F600\nG1 Z-1 F600\nG1 Z2 F300\n") == "G1 Z2 F600\nZ-1\nZ2 F300\n"
+
+def test_same_axis_moves_coalesced():
+    assert compact("G0 X1 Y0\nG0 X5\nG0 X2\nG1 Z3 F600\n") == "G0 X1 Y0\nX2\nG1 Z3 F600\n"
+    # different axes or a changed feed are not merged
+    assert compact("G0 X1\nG0 Y2\n") == "G0 X1\nY2\n"
+    assert compact("G1 X1 F600\nG1 X2 F300\n") == "G1 X1 F600\nX2 F300\n"
+
+def test_feed_strokes_keep_their_shape():
+    # a reversing brush-down stroke must keep its far end
+    assert compact("G1 Z-1 F600\nG1 X1 Y0\nG1 X5\nG1 X2\nG1 Z2\n") == "G1 Z-1 F600\nX1 Y0\nX5\nX2\nZ2\n"
+    # a stroke that keeps its direction may drop its midpoints
+    assert compact("G1 Z-1 F600\nG1 X1 Y0\nG1 X5\nG1 X7\nG1 Z2\n") == "G1 Z-1 F600\nX1 Y0\nX7\nZ2\n"
+
+def test_relative_moves_kept():
+    assert compact("G91\nG0 X1\nG0 X1\nG90\nG0 X1\n") == "G91\nG0 X1\nX1\nG90\nX1\n"
@@ -0,0 +1,29 @@
+"""dip_breaks against the original per-dot re-dip accumulator."""
+
+import numpy as np
+
+from pointillism_gcode_generator import dip_breaks
+
+def reference_breaks(steps, every_n, after_mm):
+    # the loop gen_gcode used before dip_breaks
+    out = []; dots_since = 0; travel_since = 0.0
+    for i, step in enumerate(steps):
+        travel_since += step
+        if dots_since >= every_n or (after_mm > 0 and travel_since >= after_mm):
+            out.append(i); dots_since = 0; travel_since = 0.0
+        dots_since += 1
+    return out
+
+def test_matches_reference_loop():
+    rng = np.random.default_rng(0)
+    for _ in range(2000):
+        n = int(rng.integers(1, 400))
+        steps = rng.integers(0, 20, n).astype(float)*1.5; steps[0] = 0.0
+        every_n = int(rng.integers(1, 50))
+        after_mm = float(rng.choice([0.0, 10.0, 45.0, 180.0]))
+        assert dip_breaks(steps, every_n, after_mm) == reference_breaks(steps, every_n, after_mm)
+
+def test_edges():
+    assert dip_breaks(np.zeros(1), 120, 180.0) == []
+    assert dip_breaks(np.zeros(5), 2, 0.0) == [2, 4]
+    assert dip_breaks(np.array([0.0, 100.0, 100.0, 1.0]), 120, 150.0) == [2]
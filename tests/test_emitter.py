@@ -0,0 +1,45 @@
+"""GcodeEmitter: --relative-moves must put every dab where absolute mode does."""
+
+import io
+
+import numpy as np
+
+from machine import GcodeEmitter, make_stations
+from gcode_sim import simulate
+
+def paint_run(relative, pts_mm, decimals):
+    buf = io.StringIO()
+    em = GcodeEmitter(buf, decimals=decimals, relative=relative)
+    st = make_stations(["black"])["black"]
+    em.pickup_brush(st); em.dip_brush(st)
+    for i, (x, y) in enumerate(pts_mm):
+        if i and i % 37 == 0: em.park(); em.dip_brush(st)
+        elif i % 11 == 0: em.lift()
+        em.paint_dot(x, y, 0.05, hop=True)
+    em.park(); em.return_brush(st)
+    return buf.getvalue()
+
+def check_same_dabs(pts_mm, decimals):
+    absolute = simulate(paint_run(False, pts_mm, decimals))[0]
+    relative = simulate(paint_run(True, pts_mm, decimals))[0]
+    assert len(absolute) == len(relative)
+    assert absolute == relative
+
+def test_relative_matches_absolute_inexact_pitch():
+    rng = np.random.default_rng(2)
+    cells = rng.integers(0, 60, size=(500, 2))
+    check_same_dabs(0.125 + cells*2.345, 2)
+
+def test_relative_matches_absolute_half_rounding():
+    cells = np.array([(i % 20, i // 20) for i in range(300)])
+    check_same_dabs(cells*1.5, 0)
+
+def test_hop_dabs_honor_z():
+    for relative in (False, True):
+        buf = io.StringIO()
+        em = GcodeEmitter(buf, relative=relative)
+        for i in range(6):
+            em.paint_dot(i*3.0, 1.0, 0.05, z=-1.8 if i % 2 else -1.0, hop=True)
+        em.park()
+        dabs = simulate(buf.getvalue())[0]
+        assert [d[2] for d in dabs] == [-1.0, -1.8]*3
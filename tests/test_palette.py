@@ -0,0 +1,30 @@
+"""rgb6 classification: --dither none must be the exact nearest palette color."""
+
+import numpy as np
+from PIL import Image
+
+from pointillism_gcode_generator import PALETTE_NAMES, PALETTE_RGB, nearest_palette_index
+
+def nearest_palette_color(rgb):
+    # the original per-pixel classifier
+    r,g,b = rgb
+    best, best_d2 = None, 1e18
+    for name,(R,G,B) in PALETTE_RGB.items():
+        d2 = (r-R)**2 + (g-G)**2 + (b-B)**2
+        if d2 < best_d2:
+            best, best_d2 = name, d2
+    return best
+
+def test_undithered_is_exact_nearest():
+    rng = np.random.default_rng(3)
+    px = rng.integers(0, 256, size=(40, 50, 3), dtype=np.uint8)
+    idx = nearest_palette_index(Image.fromarray(px), dither=False)
+    for y in range(px.shape[0]):
+        for x in range(px.shape[1]):
+            assert PALETTE_NAMES[idx[y,x]] == nearest_palette_color(tuple(int(v) for v in px[y,x]))
+
+def test_dithered_uses_only_palette_indices():
+    rng = np.random.default_rng(4)
+    px = rng.integers(0, 256, size=(30, 30, 3), dtype=np.uint8)
+    idx = nearest_palette_index(Image.fromarray(px), dither=True)
+    assert idx.shape == (30, 30) and idx.max() < len(PALETTE_NAMES)
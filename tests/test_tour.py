@@ -0,0 +1,36 @@
+"""nearest_neighbor_order against a brute-force greedy tour."""
+
+import numpy as np
+
+from pointillism_gcode_generator import nearest_neighbor_order, serpentine_order
+
+def assert_greedy(xy, order):
+    """Each step of order must go to a nearest remaining point (starting at (0,0))."""
+    used = np.zeros(len(xy), dtype=bool); cur = np.array([0, 0])
+    for k in order:
+        d2 = ((xy[~used] - cur)**2).sum(1).min()
+        assert ((xy[k] - cur)**2).sum() == d2
+        used[k] = True; cur = xy[k]
+
+def random_points(rng, w, n):
+    cells = rng.choice(w*w, size=min(n, w*w), replace=False)
+    return np.stack((cells % w, cells // w), 1).astype(np.int64)
+
+def test_greedy_matches_brute_force():
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        xy = random_points(rng, int(rng.integers(1, 120)), int(rng.integers(1, 300)))
+        order = nearest_neighbor_order(xy, int(rng.integers(1, 10)))
+        assert sorted(order.tolist()) == list(range(len(xy)))
+        assert_greedy(xy, order)
+
+def test_sparse_and_single_points():
+    xy = np.array([[0, 0]], dtype=np.int64)
+    assert nearest_neighbor_order(xy, 8).tolist() == [0]
+    xy = np.array([[500, 3], [2, 400], [1, 1]], dtype=np.int64)
+    assert nearest_neighbor_order(xy, 8).tolist() == [2, 1, 0]
+    assert len(nearest_neighbor_order(np.zeros((0, 2), dtype=np.int64), 8)) == 0
+
+def test_serpentine_reverses_odd_rows():
+    xy = np.array([[0, 0], [1, 0], [0, 1], [1, 1], [0, 2]], dtype=np.int64)
+    assert xy[serpentine_order(xy)].tolist() == [[0, 0], [1, 0], [1, 1], [0, 1], [0, 2]]